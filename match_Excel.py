@@ -1,7 +1,24 @@
 import pandas as pd
+import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass  # Not needed for Excel, but keeping structure
 
+try:
+    import pyarrow  # noqa: F401 - enables Arrow-backed string columns
+    KEY_DTYPE = 'string[pyarrow]'
+except ImportError:
+    KEY_DTYPE = 'string'
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit when numba is not installed - runs as plain Python."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 # =============================================================================
 # CONFIGURATION - UPDATE THESE!
 # =============================================================================
@@ -10,6 +27,10 @@ from getpass import getpass  # Not needed for Excel, but keeping structure
 JOBS_FILE = r'D:\matching_betwen_Excel_file\23-09-2025 MASTER FILE LOCATIONS_290930.xlsx'      # Your jobs Excel file
 CANDIDATES_FILE = r'D:\matching_betwen_Excel_file\screening_naukri.xlsx'         # Your candidates Excel file
 OUTPUT_DIR = r'D:\matching_betwen_Excel_file\matchfiles'
+EXPORT_PARQUET = False  # Also write a .parquet copy of the matches (needs pyarrow)
+VERBOSE = False         # Print a line per job / malformed key (slow on large files)
+MATCH_WORKERS = os.cpu_count() or 1  # Threads for matching large job files
+MATCH_CHUNK_SIZE = 50000             # Jobs per thread chunk (smaller files run single-threaded)
 
 # COLUMN NAMES - UPDATE THESE TO MATCH YOUR EXCEL FILES!
 JOBS_COLUMNS = {
@@ -27,17 +48,42 @@ CANDIDATES_COLUMNS = {
     'composite_key_col': 'composit_key'   # Column name for composite key in candidates.xlsx
 }
 
+# Helper columns added while parsing/matching composite keys (not exported)
+PARSED_KEY_COLUMNS = ['_prefix', '_salary', '_packed', '_pcode']
+
+# Job columns copied onto every matched candidate row (output name -> jobs column)
+JOB_EXPORT_COLUMNS = {
+    'job_date': JOBS_COLUMNS['date_col'],
+    'job_composit_key': JOBS_COLUMNS['composite_key_col'],
+    'job_company': JOBS_COLUMNS['company_col'],
+    'job_designation': JOBS_COLUMNS['designation_col'],
+    'job_location': JOBS_COLUMNS['location_col'],
+    'job_hr_name': JOBS_COLUMNS['hr_name_col']
+}
+
+# Bits per prefix part when packing locationcode_subproduct_product into one uint64
+PREFIX_PART_BITS = 21
+
 
 # =============================================================================
+def read_excel_file(path, key_col):
+    """Read an Excel file with the Rust-based calamine engine, falling back to openpyxl."""
+    dtype = {key_col: KEY_DTYPE}  # Keep composite keys as (Arrow) text, skip type inference
+    try:
+        return pd.read_excel(path, engine='calamine', dtype=dtype)
+    except (ImportError, ValueError):
+        # python-calamine not installed, or pandas < 2.2 (unknown engine)
+        return pd.read_excel(path, engine='openpyxl', dtype=dtype)
+
 def load_excel_data():
     """Load jobs and candidates from Excel files."""
     try:
         # Load jobs file (assumes columns: job_id, composit_key, and other job details)
-        jobs_df = pd.read_excel(JOBS_FILE)
+        jobs_df = read_excel_file(JOBS_FILE, JOBS_COLUMNS['composite_key_col'])
         print(f"✅ Loaded {len(jobs_df)} jobs from {JOBS_FILE}")
         
         # Load candidates file (assumes columns: candidate_id, composit_key, and other candidate details)
-        candidates_df = pd.read_excel(CANDIDATES_FILE)
+        candidates_df = read_excel_file(CANDIDATES_FILE, CANDIDATES_COLUMNS['composite_key_col'])
         print(f"✅ Loaded {len(candidates_df)} candidates from {CANDIDATES_FILE}")
         
         return jobs_df, candidates_df
@@ -50,101 +96,161 @@ def load_excel_data():
         print(f"❌ Error loading Excel files: {e}")
         return None, None
 
-def parse_composite_key(key_str):
-    """Split key into parts; return prefix, salary, and full parts."""
-    if pd.isna(key_str) or '_' not in str(key_str) or str(key_str).count('_') != 3:
-        raise ValueError(f"Invalid key '{key_str}': Must be exactly 4 parts separated by '_' (e.g., '126_5_8_2.6').")
+def split_composite_keys(df, key_col):
+    """Vectorized parse of a composite key column into '_prefix' and '_salary'.
+
+    Returns (valid_df, malformed_df). Keys must be exactly 4 parts separated
+    by '_' with a numeric salary last (e.g. '126_5_8_2.6'); the prefix is
+    locationcode_subproduct_product. Validation is one boolean mask, no per-row parsing.
+    """
+    parts = df[key_col].astype(KEY_DTYPE).str.split('_', n=3, expand=True)
+    parts = parts.reindex(columns=range(4)).astype(KEY_DTYPE)  # Columns missing when no key has 4 parts
+    salary = pd.to_numeric(parts[3], errors='coerce')
+    valid = (df[key_col].notna() & parts.notna().all(axis=1) & salary.notna()).to_numpy()
     
-    parts = str(key_str).split('_')
-    prefix = '_'.join(parts[:3])  # First 3: locationcode_subproduct_product
-    try:
-        salary = float(parts[3])  # Extract salary from composite_key
-    except ValueError:
-        raise ValueError(f"Invalid salary '{parts[3]}' in key '{key_str}': Must be a number like 2.6.")
+    parsed_df = df.copy()
+    parsed_df['_prefix'] = parts[0] + '_' + parts[1] + '_' + parts[2]
+    parsed_df['_salary'] = salary.astype(float)
+    parsed_df = parsed_df[valid].reset_index(drop=True)
     
-    return prefix, salary, parts
+    packed = pack_prefix(parts[valid])
+    if packed is not None:
+        parsed_df['_packed'] = packed
+    return parsed_df, df[~valid]
+
+def pack_prefix(parts):
+    """Pack the 3 prefix parts into one uint64 key (loc << 42 | sub << 21 | prod).
+
+    Returns None unless every part is a canonical integer string ('0' or no
+    leading zeros) below 2**PREFIX_PART_BITS, so packed keys are equal exactly
+    when the prefix strings are ('012' and '126.0' are left to string matching).
+    """
+    limit = 1 << PREFIX_PART_BITS
+    if not all(parts[i].str.fullmatch(r'0|[1-9]\d*').fillna(False).all() for i in range(3)):
+        return None
+    nums = [pd.to_numeric(parts[i]).to_numpy(dtype=float) for i in range(3)]
+    if not all(np.all(n < limit) for n in nums):
+        return None
+    loc, sub, prod = (n.astype(np.uint64) for n in nums)
+    return (loc << np.uint64(2 * PREFIX_PART_BITS)) | (sub << np.uint64(PREFIX_PART_BITS)) | prod
+
+@njit(cache=True, nogil=True)
+def match_jobs_to_buckets(job_codes, job_salaries, bucket_starts, sorted_rows, sorted_salaries):
+    """Matching kernel: for each job, take the candidates in its prefix bucket with salary <= target.
+
+    Buckets are contiguous slices [bucket_starts[code], bucket_starts[code + 1]) of
+    sorted_rows/sorted_salaries, sorted by salary. Returns (per-job match counts,
+    all matching row positions concatenated in job order).
+    """
+    n_jobs = len(job_codes)
+    counts = np.zeros(n_jobs, dtype=np.int64)
+    for j in range(n_jobs):
+        code = job_codes[j]
+        if code >= 0:
+            lo = bucket_starts[code]
+            hi = bucket_starts[code + 1]
+            counts[j] = np.searchsorted(sorted_salaries[lo:hi], job_salaries[j], side='right')
+    
+    out_rows = np.empty(counts.sum(), dtype=np.int64)
+    pos = 0
+    for j in range(n_jobs):
+        if counts[j] > 0:
+            lo = bucket_starts[job_codes[j]]
+            out_rows[pos:pos + counts[j]] = sorted_rows[lo:lo + counts[j]]
+            pos += counts[j]
+    return counts, out_rows
+
+def match_jobs_parallel(job_codes, job_salaries, bucket_starts, sorted_rows, sorted_salaries):
+    """Run match_jobs_to_buckets over chunks of jobs in a thread pool.
+
+    Jobs are independent and the numba kernel releases the GIL, so chunks run
+    in parallel; results are concatenated back in job order.
+    """
+    n_chunks = min(MATCH_WORKERS, -(-len(job_codes) // MATCH_CHUNK_SIZE))
+    if n_chunks <= 1:
+        return match_jobs_to_buckets(job_codes, job_salaries, bucket_starts, sorted_rows, sorted_salaries)
+    
+    bounds = np.linspace(0, len(job_codes), n_chunks + 1).astype(np.int64)
+    def match_chunk(lo, hi):
+        return match_jobs_to_buckets(job_codes[lo:hi], job_salaries[lo:hi], bucket_starts, sorted_rows, sorted_salaries)
+    
+    with ThreadPoolExecutor(max_workers=n_chunks) as pool:
+        chunks = list(pool.map(match_chunk, bounds[:-1], bounds[1:]))
+    return np.concatenate([counts for counts, _ in chunks]), np.concatenate([rows for _, rows in chunks])
+
+def parse_all_composite_keys(jobs_df, candidates_df):
+    """Parse jobs and candidates composite keys, reporting and dropping malformed rows."""
+    candidates_df, bad_candidates = split_composite_keys(candidates_df, CANDIDATES_COLUMNS['composite_key_col'])
+    if len(bad_candidates):
+        print(f"⚠️ Skipped {len(bad_candidates)} candidates with malformed keys (expected 4 parts like '126_5_8_2.6')")
+        if VERBOSE:
+            print(bad_candidates[[CANDIDATES_COLUMNS['candidate_id_col'], CANDIDATES_COLUMNS['composite_key_col']]].to_string(index=False))
+    
+    jobs_df, bad_jobs = split_composite_keys(jobs_df, JOBS_COLUMNS['composite_key_col'])
+    if len(bad_jobs):
+        print(f"🚫 Skipped {len(bad_jobs)} jobs with malformed keys (expected 4 parts like '126_5_8_2.6')")
+        if VERBOSE:
+            print(bad_jobs[[JOBS_COLUMNS['job_id_col'], JOBS_COLUMNS['composite_key_col']]].to_string(index=False))
+    
+    # One row per job_id (a repeated job_id keeps its last row, as before)
+    jobs_df = jobs_df.drop_duplicates(subset=JOBS_COLUMNS['job_id_col'], keep='last').reset_index(drop=True)
+    return jobs_df, candidates_df
 
 def find_matching_candidates_for_all_jobs(jobs_df, candidates_df):
-    """Find matching candidates for ALL jobs at once - salary extracted from composite_key."""
-    results = {}
+    """Find matching candidates for ALL jobs at once - salary extracted from composite_key.
+
+    Takes the parsed frames from parse_all_composite_keys and returns one long
+    DataFrame: a row per (job, matching candidate), keyed by the job_id column.
+    """
+    # Key on the packed integer prefix when every key allows it, else on the prefix string
+    prefix_col = '_packed' if '_packed' in candidates_df and '_packed' in jobs_df else '_prefix'
     
-    # Create a prefix lookup for candidates (for faster matching)
-    candidates_by_prefix = {}
-    for _, row in candidates_df.iterrows():
-        cand_key = row[CANDIDATES_COLUMNS['composite_key_col']]
-        try:
-            prefix, cand_salary, _ = parse_composite_key(cand_key)
-            if prefix not in candidates_by_prefix:
-                candidates_by_prefix[prefix] = []
-            candidates_by_prefix[prefix].append({
-                'candidate_id': row[CANDIDATES_COLUMNS['candidate_id_col']],
-                'salary': cand_salary,  # Extracted from composite_key
-                'full_row': row
-            })
-            print(f"📝 Processed candidate {row[CANDIDATES_COLUMNS['candidate_id_col']]}: prefix='{prefix}', salary={cand_salary}")
-        except ValueError as e:
-            print(f"⚠️ Skipping malformed candidate key '{cand_key}': {e}")
-            continue  # Skip malformed keys
-    
-    print(f"📊 Created prefix lookup with {len(candidates_by_prefix)} unique prefixes")
-    
-    # Process each job
-    for _, job_row in jobs_df.iterrows():
-        job_id = job_row[JOBS_COLUMNS['job_id_col']]
-        job_key = job_row[JOBS_COLUMNS['composite_key_col']]
-        
-        try:
-            prefix, target_salary, _ = parse_composite_key(job_key)
+    # Factorize prefixes into integer codes with one hash table (-1 = job prefix with no candidates)
+    candidates_df['_pcode'], prefixes = pd.factorize(candidates_df[prefix_col])
+    jobs_df['_pcode'] = pd.Index(prefixes).get_indexer(jobs_df[prefix_col])
+    
+    # Bucket candidate rows by prefix code with one stable sort (code, then salary);
+    # bucket `code` is the slice [bucket_starts[code], bucket_starts[code + 1]) of the sorted arrays
+    pcodes = candidates_df['_pcode'].to_numpy()
+    cand_salaries = candidates_df['_salary'].to_numpy()
+    order = np.lexsort((cand_salaries, pcodes))
+    bucket_starts = np.searchsorted(pcodes[order], np.arange(len(prefixes) + 1))
+    print(f"📊 Created prefix lookup with {len(prefixes)} unique prefixes")
+    
+    # Match every job in compiled passes (plain Python if numba is missing)
+    match_counts, match_rows = match_jobs_parallel(
+        jobs_df['_pcode'].to_numpy().astype(np.int64), jobs_df['_salary'].to_numpy(),
+        bucket_starts, order, cand_salaries[order]
+    )
+    
+    if VERBOSE:
+        job_fields = zip(jobs_df[JOBS_COLUMNS['job_id_col']], jobs_df[JOBS_COLUMNS['composite_key_col']],
+                         jobs_df['_salary'], jobs_df['_pcode'], jobs_df['_prefix'], match_counts)
+        for job_id, job_key, target_salary, pcode, prefix, count in job_fields:
             print(f"\n🔍 Processing Job {job_id} with key '{job_key}' (salary ≤ {target_salary})")
-            
-            # Find candidates with matching prefix
-            if prefix in candidates_by_prefix:
-                matches = []
-                candidate_list = candidates_by_prefix[prefix]
-                
-                for cand_data in candidate_list:
-                    if cand_data['salary'] <= target_salary:
-                        matches.append(cand_data['full_row'])
-                
-                if matches:
-                    match_df = pd.DataFrame(matches)
-                    results[job_id] = {
-                        'job_key': job_key,
-                        'target_salary': target_salary,  # From composite_key
-                        'matches': match_df,
-                        'count': len(match_df),
-                        'job_row': job_row
-                    }
-                    print(f"✅ Found {len(match_df)} matching candidates for Job {job_id}")
-                else:
-                    print(f"❌ No candidates with salary ≤ {target_salary} for Job {job_id}")
-                    results[job_id] = {
-                        'job_key': job_key,
-                        'target_salary': target_salary,
-                        'matches': pd.DataFrame(),
-                        'count': 0,
-                        'job_row': job_row
-                    }
-            else:
+            if count:
+                print(f"✅ Found {count} matching candidates for Job {job_id}")
+            elif pcode == -1:
                 print(f"❌ No candidates found for prefix '{prefix}' (Job {job_id})")
-                # Still parse the salary for consistency
-                _, target_salary, _ = parse_composite_key(job_key)
-                results[job_id] = {
-                    'job_key': job_key,
-                    'target_salary': target_salary,
-                    'matches': pd.DataFrame(),
-                    'count': 0,
-                    'job_row': job_row
-                }
-                
-        except ValueError as e:
-            print(f"🚫 Error processing Job {job_id}: {e}")
-            continue
-    
-    return results
-
-def export_to_single_excel(results):
-    """Export all matches to a single Excel file with job_id column added."""
+            else:
+                print(f"❌ No candidates with salary ≤ {target_salary} for Job {job_id}")
+    print(f"📊 {np.count_nonzero(match_counts)} of {len(jobs_df)} jobs have matching candidates")
+    
+    # Gather matched candidate rows and their job rows once, in job order
+    matches = candidates_df.iloc[match_rows]
+    job_info = jobs_df.iloc[np.repeat(np.arange(len(jobs_df)), match_counts)].reset_index(drop=True)
+    
+    # Column order: job_id first, then candidate columns, then job columns, then extracted salary
+    reserved_cols = ['job_id', *JOB_EXPORT_COLUMNS, 'extracted_salary', *PARSED_KEY_COLUMNS]
+    long_df = matches.drop(columns=[col for col in matches.columns if col in reserved_cols]).reset_index(drop=True)
+    long_df.insert(0, 'job_id', job_info[JOBS_COLUMNS['job_id_col']])
+    for out_col, job_col in JOB_EXPORT_COLUMNS.items():
+        long_df[out_col] = job_info[job_col]
+    long_df['extracted_salary'] = matches['_salary'].to_numpy()  # Parsed once in split_composite_keys
+    return long_df
+
+def export_to_single_excel(long_df):
+    """Export all matches (one row per job/candidate pair) to a single Excel file."""
     if not os.path.exists(OUTPUT_DIR):
         try:
             os.makedirs(OUTPUT_DIR)
@@ -153,66 +259,38 @@ def export_to_single_excel(results):
             print(f"❌ Failed to create directory {OUTPUT_DIR}: {e}")
             return 0
     
-    all_matches_dfs = []
-    total_matches = 0
+    if long_df.empty:
+        print("\n⚠️ No matches found across all jobs - no file created.")
+        return 0
+    
+    # Show key info extracted from composite_key for preview
+    print("\n📊 Matches Preview (first 5 per job):")
+    preview_cols = ['job_id', CANDIDATES_COLUMNS['candidate_id_col'], CANDIDATES_COLUMNS['composite_key_col'], 'extracted_salary', 'job_composit_key', 'job_company', 'job_designation']
+    print(long_df.groupby('job_id', sort=False).head()[preview_cols].to_string(index=False))
     
-    for job_id, data in results.items():
-        match_df = data['matches']
-        job_row = data['job_row']
-        
-        if not match_df.empty:
-            # Add job columns
-            match_df_with_job = match_df.copy()
-            match_df_with_job['job_id'] = job_id
-            match_df_with_job['job_date'] = job_row[JOBS_COLUMNS['date_col']]
-            match_df_with_job['job_composit_key'] = job_row[JOBS_COLUMNS['composite_key_col']]
-            match_df_with_job['job_company'] = job_row[JOBS_COLUMNS['company_col']]
-            match_df_with_job['job_designation'] = job_row[JOBS_COLUMNS['designation_col']]
-            match_df_with_job['job_location'] = job_row[JOBS_COLUMNS['location_col']]
-            match_df_with_job['job_hr_name'] = job_row[JOBS_COLUMNS['hr_name_col']]
-            
-            # Reorder columns: job_id first, then candidate columns, then other job columns
-            candidate_cols = [col for col in match_df_with_job.columns if col not in ['job_id', 'job_date', 'job_composit_key', 'job_company', 'job_designation', 'job_location', 'job_hr_name']]
-            other_job_cols = ['job_date', 'job_composit_key', 'job_company', 'job_designation', 'job_location', 'job_hr_name']
-            match_df_with_job = match_df_with_job[['job_id'] + candidate_cols + other_job_cols]
-            
-            all_matches_dfs.append(match_df_with_job)
-            total_matches += len(match_df)
-            
-            print(f"\n📊 Job {job_id} Matches Preview ({len(match_df)} candidates):")
-            # Show key info extracted from composite_key for preview
-            match_df_with_job['extracted_salary'] = match_df_with_job[CANDIDATES_COLUMNS['composite_key_col']].apply(
-                lambda x: parse_composite_key(x)[1] if pd.notna(x) else None
-            )
-            preview_cols = ['job_id', CANDIDATES_COLUMNS['candidate_id_col'], CANDIDATES_COLUMNS['composite_key_col'], 'extracted_salary', 'job_composit_key', 'job_company', 'job_designation']
-            print(match_df_with_job[preview_cols].head().to_string(index=False))
-        else:
-            print(f"📝 Job {job_id}: No matches (skipping)")
-    
-    if all_matches_dfs:
-        # Concatenate all matching DataFrames
-        combined_df = pd.concat(all_matches_dfs, ignore_index=True)
+    # Define output file
+    output_file = os.path.join(OUTPUT_DIR, 'all_job_candidate_matches.xlsx')
+    
+    try:
+        # Export to single Excel file
+        # xlsxwriter streams XML instead of building an openpyxl object model
+        long_df.to_excel(output_file, index=False, engine='xlsxwriter')
+        print(f"\n💾 Exported {len(long_df)} total matches to single Excel: {output_file}")
         
-        # Define output file
-        output_file = os.path.join(OUTPUT_DIR, 'all_job_candidate_matches.xlsx')
+        if EXPORT_PARQUET:
+            parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+            long_df.to_parquet(parquet_file, index=False)
+            print(f"💾 Also wrote Parquet copy: {parquet_file}")
         
-        try:
-            # Export to single Excel file
-            combined_df.to_excel(output_file, index=False, engine='openpyxl')
-            print(f"\n💾 Exported {total_matches} total matches to single Excel: {output_file}")
+        # Verify file creation
+        if os.path.exists(output_file):
+            print(f"✅ File verified: {output_file}")
             
-            # Verify file creation
-            if os.path.exists(output_file):
-                print(f"✅ File verified: {output_file}")
-                
-        except Exception as e:
-            print(f"❌ Failed to export combined Excel: {e}")
-            return 0
-    else:
-        print("\n⚠️ No matches found across all jobs - no file created.")
+    except Exception as e:
+        print(f"❌ Failed to export combined Excel: {e}")
         return 0
     
-    return total_matches
+    return len(long_df)
 
 def main():
     """Main function - loads Excel files and processes all jobs."""
@@ -226,22 +304,24 @@ def main():
     
     # Find matches for all jobs
     print("\n🔍 Finding matches for all jobs...")
-    results = find_matching_candidates_for_all_jobs(jobs_df, candidates_df)
-    
-    if not results:
+    jobs_df, candidates_df = parse_all_composite_keys(jobs_df, candidates_df)
+    if jobs_df.empty:
         print("❌ No results to process")
         return
+    long_df = find_matching_candidates_for_all_jobs(jobs_df, candidates_df)
     
     # Export results to single Excel
     print("\n💾 Exporting results to single Excel file...")
-    total_exported = export_to_single_excel(results)
+    total_exported = export_to_single_excel(long_df)
     
     # Summary report
     print("\n📈 SUMMARY REPORT:")
     print("-" * 30)
-    for job_id, data in results.items():
-        status = "✅ HAS MATCHES" if data['count'] > 0 else "❌ NO MATCHES"
-        print(f"Job {job_id}: {status} ({data['count']} candidates, target ≤ {data['target_salary']})")
+    match_counts = long_df.groupby('job_id', sort=False).size()
+    for job_id, target_salary in zip(jobs_df[JOBS_COLUMNS['job_id_col']], jobs_df['_salary']):
+        count = match_counts.get(job_id, 0)
+        status = "✅ HAS MATCHES" if count > 0 else "❌ NO MATCHES"
+        print(f"Job {job_id}: {status} ({count} candidates, target ≤ {target_salary})")
     
     print(f"\n🎯 All done! Check {OUTPUT_DIR} for 'all_job_candidate_matches.xlsx'.")
     print(f"📁 Total rows in Excel: {total_exported}")